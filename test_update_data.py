@@ -0,0 +1,166 @@
+"""Tests for the incremental CSV update in update_data.py"""
+
+import json
+
+import pandas as pd
+import pytest
+import requests
+
+import update_data
+
+HEADER = "timestamp,open,high,low,close,volume\n"
+ROWS = [
+    "2026-02-01 13:00:00,78976.9,79006.0,78525.2,78611.4,341.03047375\n",
+    "2026-02-01 14:00:00,78611.5,78819.8,78267.1,78300.1,300.50304115\n",
+    "2026-02-01 15:00:00,78300.0,78400.0,78200.0,78350.0,12.5\n",
+]
+LATEST = pd.Timestamp("2026-02-01 15:00:00")
+HOUR_MS = 3600 * 1000
+
+
+def make_klines(start, count):
+    """Klines for `count` consecutive hours starting at a GMT+8 timestamp"""
+    start_ms = update_data.to_epoch_ms(start)
+    return [(start_ms + i * HOUR_MS, 1.5 + i, 2.5 + i, 0.5 + i, 1.0 + i, 10.0 + i) for i in range(count)]
+
+
+def expected_rows(start, count):
+    return [
+        f"{start + pd.Timedelta(hours=i):%Y-%m-%d %H:%M:%S},{1.5 + i},{2.5 + i},{0.5 + i},{1.0 + i},{10.0 + i}\n"
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def csv_file(tmp_path, monkeypatch):
+    path = tmp_path / "history.csv"
+    path.write_text(HEADER + "".join(ROWS), newline="")
+    monkeypatch.setattr(update_data, "CSV_FILE", str(path))
+    yield path
+    update_data.read_latest_row.cache_clear()
+
+
+def run_update(monkeypatch, klines):
+    monkeypatch.setattr(update_data, "fetch_recent_klines", lambda since_ts=None: klines)
+    return update_data.update_csv()
+
+
+def test_read_latest_row_scans_back_across_blocks(csv_file, monkeypatch):
+    monkeypatch.setattr(update_data, "TAIL_BLOCK_SIZE", 8)
+
+    timestamp, offset = update_data.read_latest_row(str(csv_file))
+
+    assert timestamp == LATEST
+    assert csv_file.read_bytes()[offset:] == ROWS[-1].encode()
+
+
+def test_read_latest_row_without_trailing_newline(tmp_path):
+    path = tmp_path / "history.csv"
+    path.write_text(HEADER + "".join(ROWS).rstrip("\n"), newline="")
+
+    timestamp, offset = update_data.read_latest_row(str(path))
+
+    assert timestamp == LATEST
+    assert path.read_bytes()[offset:] == ROWS[-1].rstrip("\n").encode()
+
+
+def test_read_latest_row_rejects_header_only_file(tmp_path):
+    path = tmp_path / "history.csv"
+    path.write_text(HEADER, newline="")
+
+    with pytest.raises(ValueError):
+        update_data.read_latest_row(str(path))
+
+
+def test_refreshes_latest_row_and_appends(csv_file, monkeypatch):
+    older = make_klines(LATEST - pd.Timedelta(hours=2), 2)
+
+    assert run_update(monkeypatch, older + make_klines(LATEST, 3))
+
+    expected = HEADER + "".join(ROWS[:-1]) + "".join(expected_rows(LATEST, 3))
+    assert csv_file.read_text() == expected
+
+
+def test_gap_appends_without_truncating(csv_file, monkeypatch):
+    start = LATEST + pd.Timedelta(hours=3)
+
+    assert run_update(monkeypatch, make_klines(start, 2))
+
+    assert csv_file.read_text() == HEADER + "".join(ROWS) + "".join(expected_rows(start, 2))
+
+
+@pytest.mark.parametrize("count", [update_data.FAST_PATH_ROWS, update_data.FAST_PATH_ROWS + 7])
+def test_fast_path_and_frame_path_write_the_same_rows(csv_file, monkeypatch, count):
+    assert run_update(monkeypatch, make_klines(LATEST, count))
+
+    expected = HEADER + "".join(ROWS[:-1]) + "".join(expected_rows(LATEST, count))
+    assert csv_file.read_bytes() == expected.encode()
+
+
+def test_already_up_to_date_leaves_file_untouched(csv_file, monkeypatch):
+    before = csv_file.read_bytes()
+
+    assert run_update(monkeypatch, [])
+
+    assert csv_file.read_bytes() == before
+
+
+def test_fetch_failure_leaves_file_untouched(csv_file, monkeypatch):
+    before = csv_file.read_bytes()
+
+    assert not run_update(monkeypatch, None)
+
+    assert csv_file.read_bytes() == before
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    @property
+    def content(self):
+        return json.dumps(self.payload).encode()
+
+
+class FakeSession:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def get(self, url, params=None, timeout=None):
+        return FakeResponse(self.payload)
+
+
+def bybit_payload(klines):
+    rows = [[str(k[0]), *map(str, k[1:]), "0"] for k in reversed(klines)]
+    return {"retCode": 0, "result": {"list": rows}}
+
+
+def test_bybit_rows_are_parsed_in_time_order():
+    klines = make_klines(LATEST, 3)
+
+    assert update_data.fetch_from_bybit(session=FakeSession(bybit_payload(klines))) == klines
+
+
+def test_bybit_malformed_row_is_a_failed_fetch():
+    payload = bybit_payload(make_klines(LATEST, 3))
+    payload["result"]["list"][0][5] = ""
+
+    assert update_data.fetch_from_bybit(session=FakeSession(payload)) is None
+
+
+def test_network_error_counts_against_the_circuit(tmp_path, monkeypatch):
+    monkeypatch.setattr(update_data, "CIRCUIT_FILE", str(tmp_path / "circuit.json"))
+    klines = make_klines(LATEST, 2)
+
+    def unreachable(limit, since_ms):
+        raise requests.exceptions.ConnectionError("unreachable")
+
+    monkeypatch.setattr(update_data, "fetch_from_bybit", unreachable)
+    monkeypatch.setattr(update_data, "fetch_from_okx", lambda limit, since_ms: klines)
+    monkeypatch.setattr(update_data, "fetch_from_cryptocompare", lambda limit, since_ms: None)
+
+    assert update_data.fetch_recent_klines() == klines
+    assert update_data.load_circuit() == {"bybit": {"failures": 1}}
@@ -11,35 +11,271 @@ API Priority:
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
 import pandas as pd
+import numpy as np
 from datetime import datetime, timezone, timedelta
+import argparse
+import csv
+import functools
+import io
+import json
 import os
+import queue
 import sys
+import threading
+import time
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:
+    pa = None
 
 # Configuration
 CSV_FILE = 'BTC_OHLC_1h_gmt8_updated.csv'
-LIMIT = 100  # Fetch last 100 candles to ensure overlap
+LIMIT = 100  # Default / maximum number of candles to fetch
+MIN_LIMIT = 4  # Smallest fetch when the CSV is already current
+FETCH_OVERLAP = 3  # Extra candles fetched beyond the gap for safety
+COLD_START_GAP = timedelta(days=4)  # Larger gaps fall back to LIMIT
+OHLCV_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+CSV_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+CSV_DTYPES = {col: 'float64' for col in OHLCV_COLUMNS}
+TAIL_BLOCK_SIZE = 4096  # Bytes read per step when scanning the CSV from the end
+GMT8_OFFSET = pd.Timedelta(hours=8)  # Asia/Singapore has no DST, so a fixed offset is exact
+GMT8_EPOCH = datetime(1970, 1, 1) + GMT8_OFFSET  # Unix epoch as a naive GMT+8 datetime
+FAST_PATH_ROWS = 5  # At most this many fresh candles are converted without pandas
+HTTP_TIMEOUT = (5, 10)  # (connect, read) seconds
+RETRY_TOTAL = 2  # Adapter-level retries per request
+RETRY_BACKOFF = 0.5  # Retry backoff factor (seconds)
+# Overall budget for the concurrent API fetch: every attempt timing out, plus backoff sleeps
+FETCH_TIMEOUT = (RETRY_TOTAL + 1) * sum(HTTP_TIMEOUT) + RETRY_BACKOFF * (2 ** RETRY_TOTAL - 1) + 5
+PRIORITY_GRACE = 0.5  # Wait this long for a preferred API after the first success
+
+CIRCUIT_FILE = '.circuit.json'  # Consecutive failed runs per endpoint (kept in the Actions cache)
+CIRCUIT_FAILURES = 3  # Consecutive failed runs that open the circuit
+CIRCUIT_COOLDOWN = timedelta(hours=6)  # How long an open circuit skips the endpoint
+
+# Network failures that make us fall back to the next API and count towards its circuit
+FALLBACK_ERRORS = (requests.exceptions.RequestException,)
+# Payloads that don't have the documented shape
+MALFORMED_RESPONSE_ERRORS = (AttributeError, KeyError, IndexError, TypeError, ValueError)
+
+_log_lock = threading.Lock()
+
+def create_session():
+    """Create a shared HTTP session with keep-alive connection pooling"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=8,
+        # Transient failures are retried here before we fall back to another API
+        # (a long Retry-After would outlast FETCH_TIMEOUT, so it is not honoured)
+        max_retries=Retry(
+            total=RETRY_TOTAL,
+            backoff_factor=RETRY_BACKOFF,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=['GET'],
+            respect_retry_after_header=False
+        )
+    )
+    session.mount('https://', adapter)
+    session.headers.update({
+        'Accept-Encoding': ACCEPT_ENCODING,  # gzip/deflate, plus br/zstd when decoders are installed
+        'User-Agent': 'btc-db-v3/1.0',
+        'Connection': 'keep-alive'
+    })
+    return session
+
+# Reused by every fetcher so TLS handshakes are paid once per host
+SESSION = create_session()
 
 def log(message):
     """Print timestamped log message"""
     timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')
-    print(f"[{timestamp}] {message}")
+    # Fetch threads log concurrently; keep each message on its own line
+    with _log_lock:
+        print(f"[{timestamp}] {message}")
+
+def load_circuit():
+    """Load circuit breaker state, keyed by endpoint"""
+    try:
+        with open(CIRCUIT_FILE) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def save_circuit(circuit):
+    # Write a temporary file and swap it in, so a reader never sees a partial file
+    tmp_file = f"{CIRCUIT_FILE}.tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(circuit, f, indent=2)
+    os.replace(tmp_file, CIRCUIT_FILE)
+
+def is_circuit_open(circuit, source):
+    """Check whether an endpoint is being skipped after repeated failures"""
+    open_until = circuit.get(source, {}).get('open_until')
+    return open_until is not None and datetime.now(timezone.utc) < datetime.fromisoformat(open_until)
+
+def update_circuit(circuit, outcomes):
+    """
+    Apply this run's outcome per endpoint: a success clears its failure history,
+    a failure counts towards opening the circuit. The count is kept, so a
+    failure after the cooldown reopens it.
+    """
+    now = datetime.now(timezone.utc)
+    changed = False
+    
+    for source, succeeded in outcomes.items():
+        if succeeded:
+            changed |= circuit.pop(source, None) is not None
+            continue
+        
+        entry = circuit.setdefault(source, {})
+        entry['failures'] = entry.get('failures', 0) + 1
+        changed = True
+        
+        if entry['failures'] >= CIRCUIT_FAILURES:
+            entry['open_until'] = (now + CIRCUIT_COOLDOWN).isoformat()
+            log(f"⚠ {source}: {entry['failures']} failed runs in a row, skipping it until {entry['open_until']}")
+    
+    if changed:
+        save_circuit(circuit)
+
+def to_epoch_ms(timestamp):
+    """Convert a naive GMT+8 timestamp to Unix milliseconds"""
+    return int((timestamp - GMT8_OFFSET).timestamp() * 1000)
+
+def from_epoch_ms(open_time_ms):
+    """Convert Unix milliseconds to a naive GMT+8 datetime"""
+    return GMT8_EPOCH + timedelta(milliseconds=open_time_ms)
+
+def parse_kline(row):
+    """Convert one raw API row to a kline (open_time_ms, open, high, low, close, volume)"""
+    return (int(row[0]), *(float(value) for value in row[1:6]))
+
+def kline_to_row(kline):
+    """Convert one kline to a CSV row (GMT+8 timestamp, OHLCV floats) without pandas"""
+    return (from_epoch_ms(kline[0]), *kline[1:6])
+
+def klines_to_frame(klines):
+    """Build an OHLCV frame indexed by GMT+8 timestamp from klines in time order"""
+    # Build the OHLCV block in one pass
+    open_time = np.asarray([row[0] for row in klines], dtype=np.int64)
+    values = np.asarray([row[1:6] for row in klines], dtype=np.float64)
+    df = pd.DataFrame(values, columns=OHLCV_COLUMNS)
+    
+    # Convert timestamp to GMT+8 (Asia/Singapore timezone)
+    df['timestamp'] = pd.to_datetime(open_time, unit='ms') + GMT8_OFFSET
+    
+    df.set_index('timestamp', inplace=True)
+    return df
+
+def cached_until_modified(func):
+    """
+    Memoize a CSV reader for the current file version, keyed on its path,
+    modification time and size. Errors propagate and are not cached.
+    Returned objects are shared: do not mutate them.
+    """
+    @functools.lru_cache(maxsize=1)
+    def cached(csv_file, mtime_ns, size):
+        return func(csv_file)
+    
+    @functools.wraps(func)
+    def wrapper(csv_file):
+        stat = os.stat(csv_file)
+        return cached(csv_file, stat.st_mtime_ns, stat.st_size)
+    
+    wrapper.cache_clear = cached.cache_clear
+    return wrapper
+
+@cached_until_modified
+def read_latest_row(csv_file):
+    """
+    Read the latest timestamp from the end of the CSV file, and the byte
+    offset where that last row starts
+    """
+    with open(csv_file, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        start = f.tell()
+        tail = b''
+        
+        # Read backwards until the buffer holds the whole last row
+        while start > 0 and b'\n' not in tail.rstrip(b'\r\n'):
+            step = min(TAIL_BLOCK_SIZE, start)
+            start -= step
+            f.seek(start)
+            tail = f.read(step) + tail
+    
+    body = tail.rstrip(b'\r\n')
+    row_start = body.rfind(b'\n') + 1
+    last_row_offset = start + row_start
+    
+    if last_row_offset == 0:
+        raise ValueError(f"CSV file has no data rows: {csv_file}")
+    
+    last_row = body[row_start:].decode()
+    return pd.Timestamp(last_row.split(',', 1)[0]), last_row_offset
 
 def get_latest_timestamp_from_csv(csv_file):
-    """Get the latest timestamp from the existing CSV file"""
+    """
+    Get the latest timestamp from the existing CSV file, reading only its tail.
+    Also returns the byte offset where that last row starts.
+    """
     try:
-        df = pd.read_csv(csv_file, parse_dates=['timestamp'])
-        latest_timestamp = df['timestamp'].max()
-        log(f"✓ Current CSV latest timestamp: {latest_timestamp}")
-        return latest_timestamp, df
+        latest_timestamp, last_row_offset = read_latest_row(csv_file)
     except FileNotFoundError:
         log(f"⚠ CSV file not found: {csv_file}")
         return None, None
     except Exception as e:
         log(f"❌ Error reading CSV: {e}")
         return None, None
+    
+    log(f"✓ Current CSV latest timestamp: {latest_timestamp}")
+    return latest_timestamp, last_row_offset
 
-def fetch_from_bybit(limit=100):
+def read_csv_arrow(csv_file):
+    """Parse the CSV with pyarrow's multithreaded reader"""
+    columns = ['timestamp'] + OHLCV_COLUMNS
+    column_types = {col: pa.float64() for col in OHLCV_COLUMNS}
+    column_types['timestamp'] = pa.timestamp('ns')
+    
+    table = pacsv.read_csv(csv_file, convert_options=pacsv.ConvertOptions(
+        column_types=column_types,
+        include_columns=columns,
+        timestamp_parsers=[CSV_TIMESTAMP_FORMAT]
+    ))
+    # Free Arrow buffers as they are handed to pandas to halve peak memory
+    return table.to_pandas(self_destruct=True)
+
+@cached_until_modified
+def read_csv_history(csv_file):
+    """Parse the full CSV history indexed by timestamp"""
+    if pa is not None:
+        df = read_csv_arrow(csv_file)
+    else:
+        df = pd.read_csv(csv_file, dtype=CSV_DTYPES)
+        df['timestamp'] = pd.to_datetime(df['timestamp'], format=CSV_TIMESTAMP_FORMAT)
+    df.set_index('timestamp', inplace=True)
+    return df
+
+def load_csv(csv_file):
+    """Load the full CSV history indexed by timestamp"""
+    try:
+        return read_csv_history(csv_file)
+    except Exception as e:
+        log(f"❌ Error reading CSV: {e}")
+        return None
+
+def fetch_from_bybit(limit=100, since_ms=None, session=SESSION):
     """
     Fetch from Bybit API (no geo-restrictions)
     https://bybit-exchange.github.io/docs/v5/market/kline
@@ -50,15 +286,15 @@ def fetch_from_bybit(limit=100):
         'category': 'spot',
         'symbol': 'BTCUSDT',
         'interval': '60',  # 60 minutes = 1 hour
-        'limit': limit
+        'limit': min(limit, 1000)  # Bybit maximum
     }
     
     try:
         log("Trying Bybit API...")
-        response = requests.get(url, params=params, timeout=30)
+        response = session.get(url, params=params, timeout=HTTP_TIMEOUT)
         response.raise_for_status()
         
-        data = response.json()
+        data = json_loads(response.content)
         
         if data.get('retCode') != 0:
             log(f"⚠ Bybit API error: {data.get('retMsg')}")
@@ -70,38 +306,26 @@ def fetch_from_bybit(limit=100):
             log("⚠ No data returned from Bybit")
             return None
         
-        # Bybit returns: [startTime, openPrice, highPrice, lowPrice, closePrice, volume, turnover]
-        df = pd.DataFrame(klines, columns=[
-            'open_time', 'open', 'high', 'low', 'close', 'volume', 'turnover'
-        ])
-        
-        # Convert timestamp to datetime (UTC)
-        df['timestamp'] = pd.to_datetime(df['open_time'].astype(int), unit='ms', utc=True)
-        
-        # Convert to GMT+8 (Asia/Singapore timezone)
-        df['timestamp'] = df['timestamp'].dt.tz_convert('Asia/Singapore').dt.tz_localize(None)
-        
-        # Select columns
-        df = df[['timestamp', 'open', 'high', 'low', 'close', 'volume']].copy()
+        # Nothing to return when the API has no candle at or after the latest stored one
+        # (Bybit returns newest first); an equal candle is kept so it can be refreshed
+        if since_ms is not None and int(klines[0][0]) < since_ms:
+            log("✓ Bybit: No new candles")
+            return []
         
-        # Convert to float
-        for col in ['open', 'high', 'low', 'close', 'volume']:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
+        # Bybit returns [startTime, openPrice, highPrice, lowPrice, closePrice, volume, turnover]
+        # rows newest first as strings: parse them here, in time order, so a bad
+        # value counts as this API's failure
+        klines = [parse_kline(row) for row in reversed(klines)]
         
-        # Sort by timestamp (Bybit returns newest first)
-        df = df.sort_values('timestamp')
-        df.set_index('timestamp', inplace=True)
+        log(f"✓ Bybit: Fetched {len(klines)} rows")
         
-        log(f"✓ Bybit: Fetched {len(df)} rows")
-        log(f"  Date range: {df.index.min()} to {df.index.max()}")
+        return klines
         
-        return df
-        
-    except Exception as e:
-        log(f"⚠ Bybit failed: {e}")
+    except MALFORMED_RESPONSE_ERRORS as e:
+        log(f"⚠ Bybit returned an unexpected response: {e}")
         return None
 
-def fetch_from_cryptocompare(limit=100):
+def fetch_from_cryptocompare(limit=100, since_ms=None, session=SESSION):
     """
     Fetch from CryptoCompare API (free, no geo-restrictions)
     https://min-api.cryptocompare.com/
@@ -111,16 +335,16 @@ def fetch_from_cryptocompare(limit=100):
     params = {
         'fsym': 'BTC',
         'tsym': 'USDT',
-        'limit': limit,
+        'limit': min(limit, 2000),  # CryptoCompare maximum
         'e': 'binance'  # Use Binance as exchange reference
     }
     
     try:
         log("Trying CryptoCompare API...")
-        response = requests.get(url, params=params, timeout=30)
+        response = session.get(url, params=params, timeout=HTTP_TIMEOUT)
         response.raise_for_status()
         
-        data = response.json()
+        data = json_loads(response.content)
         
         if data.get('Response') != 'Success':
             log(f"⚠ CryptoCompare error: {data.get('Message')}")
@@ -132,41 +356,27 @@ def fetch_from_cryptocompare(limit=100):
             log("⚠ No data returned from CryptoCompare")
             return None
         
-        df = pd.DataFrame(klines)
-        
-        # Convert timestamp
-        df['timestamp'] = pd.to_datetime(df['time'], unit='s', utc=True)
-        
-        # Convert to GMT+8
-        df['timestamp'] = df['timestamp'].dt.tz_convert('Asia/Singapore').dt.tz_localize(None)
-        
-        # Rename columns
-        df = df.rename(columns={
-            'open': 'open',
-            'high': 'high', 
-            'low': 'low',
-            'close': 'close',
-            'volumefrom': 'volume'
-        })
-        
-        df = df[['timestamp', 'open', 'high', 'low', 'close', 'volume']].copy()
-        
-        for col in ['open', 'high', 'low', 'close', 'volume']:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
+        # Nothing to return when the API has no candle at or after the latest stored one
+        # (CryptoCompare returns oldest first); an equal candle is kept so it can be refreshed
+        if since_ms is not None and int(klines[-1]['time']) * 1000 < since_ms:
+            log("✓ CryptoCompare: No new candles")
+            return []
         
-        df.set_index('timestamp', inplace=True)
-        df = df.sort_index()
+        # Keep only (open_time_ms, open, high, low, close, volume) (already oldest first)
+        klines = [
+            parse_kline((int(k['time']) * 1000, k['open'], k['high'], k['low'], k['close'], k['volumefrom']))
+            for k in klines
+        ]
         
-        log(f"✓ CryptoCompare: Fetched {len(df)} rows")
-        log(f"  Date range: {df.index.min()} to {df.index.max()}")
+        log(f"✓ CryptoCompare: Fetched {len(klines)} rows")
         
-        return df
+        return klines
         
-    except Exception as e:
-        log(f"⚠ CryptoCompare failed: {e}")
+    except MALFORMED_RESPONSE_ERRORS as e:
+        log(f"⚠ CryptoCompare returned an unexpected response: {e}")
         return None
 
-def fetch_from_okx(limit=100):
+def fetch_from_okx(limit=100, since_ms=None, session=SESSION):
     """
     Fetch from OKX API (no geo-restrictions for market data)
     https://www.okx.com/docs-v5/en/
@@ -176,15 +386,15 @@ def fetch_from_okx(limit=100):
     params = {
         'instId': 'BTC-USDT',
         'bar': '1H',
-        'limit': str(limit)
+        'limit': str(min(limit, 300))  # OKX maximum
     }
     
     try:
         log("Trying OKX API...")
-        response = requests.get(url, params=params, timeout=30)
+        response = session.get(url, params=params, timeout=HTTP_TIMEOUT)
         response.raise_for_status()
         
-        data = response.json()
+        data = json_loads(response.content)
         
         if data.get('code') != '0':
             log(f"⚠ OKX error: {data.get('msg')}")
@@ -196,115 +406,215 @@ def fetch_from_okx(limit=100):
             log("⚠ No data returned from OKX")
             return None
         
-        # OKX returns: [ts, o, h, l, c, vol, volCcy, volCcyQuote, confirm]
-        df = pd.DataFrame(klines, columns=[
-            'open_time', 'open', 'high', 'low', 'close', 'volume', 
-            'volCcy', 'volCcyQuote', 'confirm'
-        ])
-        
-        # Convert timestamp
-        df['timestamp'] = pd.to_datetime(df['open_time'].astype(int), unit='ms', utc=True)
-        
-        # Convert to GMT+8
-        df['timestamp'] = df['timestamp'].dt.tz_convert('Asia/Singapore').dt.tz_localize(None)
+        # Nothing to return when the API has no candle at or after the latest stored one
+        # (OKX returns newest first); an equal candle is kept so it can be refreshed
+        if since_ms is not None and int(klines[0][0]) < since_ms:
+            log("✓ OKX: No new candles")
+            return []
         
-        df = df[['timestamp', 'open', 'high', 'low', 'close', 'volume']].copy()
+        # OKX returns [ts, o, h, l, c, vol, volCcy, volCcyQuote, confirm]
+        # rows newest first as strings: parse them here, in time order, so a bad
+        # value counts as this API's failure
+        klines = [parse_kline(row) for row in reversed(klines)]
         
-        for col in ['open', 'high', 'low', 'close', 'volume']:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
+        log(f"✓ OKX: Fetched {len(klines)} rows")
         
-        # Sort (OKX returns newest first)
-        df = df.sort_values('timestamp')
-        df.set_index('timestamp', inplace=True)
+        return klines
         
-        log(f"✓ OKX: Fetched {len(df)} rows")
-        log(f"  Date range: {df.index.min()} to {df.index.max()}")
-        
-        return df
-        
-    except Exception as e:
-        log(f"⚠ OKX failed: {e}")
+    except MALFORMED_RESPONSE_ERRORS as e:
+        log(f"⚠ OKX returned an unexpected response: {e}")
         return None
 
-def fetch_recent_klines(limit=100):
+def get_fetch_limit(since_ts):
+    """Number of candles needed to cover the gap since the latest stored candle"""
+    if since_ts is None:
+        return LIMIT
+    
+    now_sg = pd.Timestamp.now(tz='UTC').tz_localize(None) + GMT8_OFFSET
+    gap = now_sg - since_ts
+    
+    # Cold start or long outage: fall back to the default window
+    if gap > COLD_START_GAP:
+        return LIMIT
+    
+    return min(LIMIT, max(MIN_LIMIT, int(gap / timedelta(hours=1)) + FETCH_OVERLAP))
+
+def fetch_recent_klines(since_ts=None):
     """
-    Try multiple APIs with fallback
+    Query all APIs concurrently and keep the most preferred successful result.
+    Returns klines in time order, each (open_time_ms, open, high, low, close, volume).
     """
+    limit = get_fetch_limit(since_ts)
+    since_ms = None if since_ts is None else to_epoch_ms(since_ts)
     log(f"Fetching {limit} most recent hourly candles...")
     
-    # Try APIs in order of preference
+    # APIs in order of preference
     apis = [
-        ("Bybit", fetch_from_bybit),
-        ("OKX", fetch_from_okx),
-        ("CryptoCompare", fetch_from_cryptocompare),
+        ("Bybit", 'bybit', fetch_from_bybit),
+        ("OKX", 'okx', fetch_from_okx),
+        ("CryptoCompare", 'cryptocompare', fetch_from_cryptocompare),
     ]
     
-    for name, fetch_func in apis:
-        df = fetch_func(limit)
-        if df is not None and len(df) > 0:
-            log(f"✓ Successfully fetched data from {name}")
-            return df
+    finished = queue.Queue()
+    
+    def run_fetch(rank, fetch_func):
+        try:
+            finished.put((rank, fetch_func(limit, since_ms), None))
+        except Exception as e:
+            finished.put((rank, None, e))
+    
+    # Circuit state is read once and only updated here, from the fetches that finished
+    circuit = load_circuit()
+    outcomes = {}
+    
+    # Daemon threads, so an API still stuck in a request cannot delay exit
+    pending = set()
+    for rank, (name, source, fetch_func) in enumerate(apis):
+        if is_circuit_open(circuit, source):
+            log(f"⚠ Skipping {name} (circuit open after repeated failures)")
+            continue
+        threading.Thread(target=run_fetch, args=(rank, fetch_func), daemon=True).start()
+        pending.add(rank)
+    results = {}
+    deadline = time.monotonic() + FETCH_TIMEOUT
+    
+    while pending:
+        try:
+            rank, klines, error = finished.get(timeout=max(0, deadline - time.monotonic()))
+        except queue.Empty:
+            break
+        pending.discard(rank)
+        name, source, _ = apis[rank]
+        
+        # One API misbehaving must never break the fallback to the others
+        if isinstance(error, FALLBACK_ERRORS):
+            log(f"⚠ {name} failed: {error}")
+            outcomes[source] = False
+        elif error is not None:
+            log(f"⚠ {name} failed unexpectedly: {error}")
+        elif klines is not None:
+            results[rank] = (name, klines)
+            outcomes[source] = True
+        
+        if not results:
+            continue
+        
+        # Stop once no pending API is preferred over the best result so far
+        best_rank = min(results)
+        if all(other > best_rank for other in pending):
+            break
+        
+        # Give higher-priority APIs a short grace window after the first success
+        deadline = min(deadline, time.monotonic() + PRIORITY_GRACE)
+    
+    # APIs still in flight when a result is chosen are left out, so successes and
+    # failures are counted alike
+    update_circuit(circuit, outcomes)
+    
+    if results:
+        name, klines = results[min(results)]
+        log(f"✓ Successfully fetched data from {name}")
+        return klines
     
     log("❌ All APIs failed")
     return None
 
-def update_csv():
+def rebuild_csv(df_new):
+    """Merge new data into the full history and rewrite the whole CSV"""
+    df_existing = load_csv(CSV_FILE)
+    
+    if df_existing is None:
+        log("❌ Cannot proceed without existing CSV file")
+        return False
+    
+    if not df_existing.index.is_monotonic_increasing:
+        df_existing = df_existing.sort_index()
+    
+    # New data is a sorted tail: keep existing rows before it and let the API data
+    # replace the overlap (it is more recent), so no dedup scan or re-sort is needed
+    cutoff = df_existing.index.searchsorted(df_new.index.min())
+    df_combined = pd.concat([df_existing.iloc[:cutoff], df_new])
+    
+    new_rows = len(df_combined) - len(df_existing)
+    
+    df_combined.to_csv(CSV_FILE, index_label='timestamp', date_format=CSV_TIMESTAMP_FORMAT)
+    
+    log(f"✓ CSV file rebuilt successfully:")
+    log(f"  • Total rows: {len(df_combined)}")
+    log(f"  • Earliest timestamp: {df_combined.index.min()}")
+    log(f"  • Latest timestamp: {df_combined.index.max()}")
+    log(f"  • New rows added: {new_rows}")
+    
+    return True
+
+def update_csv(rebuild=False):
     """Main function to update CSV with latest data"""
     log("=" * 50)
     log("Starting BTC OHLC Data Update")
     log("=" * 50)
     
-    # Get current CSV data
-    latest_csv_time, df_existing = get_latest_timestamp_from_csv(CSV_FILE)
+    # Get current CSV position
+    latest_csv_time, last_row_offset = get_latest_timestamp_from_csv(CSV_FILE)
     
-    if df_existing is None:
+    if latest_csv_time is None:
         log("❌ Cannot proceed without existing CSV file")
         return False
     
-    # Ensure existing data has proper index
-    if 'timestamp' in df_existing.columns:
-        df_existing.set_index('timestamp', inplace=True)
-    
-    # Fetch recent data
-    df_new = fetch_recent_klines(limit=LIMIT)
+    # Fetch recent data (only the gap since the latest candle, unless rebuilding)
+    klines = fetch_recent_klines(since_ts=None if rebuild else latest_csv_time)
     
-    if df_new is None or len(df_new) == 0:
+    if klines is None:
         log("❌ Failed to fetch new data from any API")
         return False
     
-    # Combine with existing data
-    df_combined = pd.concat([df_existing, df_new])
+    if rebuild:
+        return rebuild_csv(klines_to_frame(klines))
     
-    # Remove duplicates (keep last - API data is more recent)
-    df_combined = df_combined[~df_combined.index.duplicated(keep='last')]
+    # Rewrite the latest stored candle (it may have been incomplete) and append newer ones
+    since_ms = to_epoch_ms(latest_csv_time)
+    fresh = [row for row in klines if row[0] >= since_ms]
     
-    # Sort by timestamp
-    df_combined.sort_index(inplace=True)
+    if not fresh:
+        log("✓ CSV already up to date")
+        log(f"  • Latest timestamp: {latest_csv_time}")
+        return True
     
-    # Check if we have new data
-    new_rows = len(df_combined) - len(df_existing)
+    # Render every row before the file is touched, so a failure cannot leave it half-written
+    # (a handful of candles, the steady-state hourly run, is rendered without pandas)
+    if len(fresh) <= FAST_PATH_ROWS:
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator='\n').writerows(kline_to_row(row) for row in fresh)
+        rows_text = buffer.getvalue()
+    else:
+        rows_text = klines_to_frame(fresh).to_csv(header=False, lineterminator='\n')
     
-    if new_rows > 0:
-        # Save updated data
-        df_combined.to_csv(CSV_FILE)
-        
-        log(f"✓ CSV file updated successfully:")
-        log(f"  • Total rows: {len(df_combined)}")
-        log(f"  • Earliest timestamp: {df_combined.index.min()}")
-        log(f"  • Latest timestamp: {df_combined.index.max()}")
-        log(f"  • New rows added: {new_rows}")
-        
-        return True
+    if fresh[0][0] == since_ms:
+        os.truncate(CSV_FILE, last_row_offset)
     else:
-        # Still save to update any corrected values
-        df_combined.to_csv(CSV_FILE)
-        log("✓ CSV updated (no new rows, but data refreshed)")
-        log(f"  • Latest timestamp: {df_combined.index.max()}")
-        return True
+        log(f"⚠ Gap between CSV ({latest_csv_time}) and fetched data ({from_epoch_ms(fresh[0][0])})")
+    
+    with open(CSV_FILE, 'a', newline='') as f:
+        f.write(rows_text)
+    
+    new_rows = sum(row[0] > since_ms for row in fresh)
+    
+    log(f"✓ CSV file updated successfully:")
+    log(f"  • Rows written: {len(fresh)}")
+    log(f"  • Latest timestamp: {from_epoch_ms(fresh[-1][0])}")
+    log(f"  • New rows added: {new_rows}")
+    
+    return True
 
 def main():
+    parser = argparse.ArgumentParser(description="Update BTC OHLC data")
+    parser.add_argument(
+        '--rebuild', action='store_true',
+        help="Rewrite the whole CSV instead of appending (applies corrections to older rows)"
+    )
+    args = parser.parse_args()
+    
     try:
-        success = update_csv()
+        success = update_csv(rebuild=args.rebuild)
         if success:
             log("✓ Data update completed successfully")
             sys.exit(0)